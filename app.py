@@ -6,27 +6,34 @@ import os
 import pickle
 import heapq
 from collections import defaultdict, Counter
-from datetime import datetime
+from datetime import datetime, timedelta
 import time
 import tempfile
 import uuid
 from functools import wraps
+from storage import StorageManager, StorageGarbageCollector
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 
 # Use SQLite database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///compression_db.sqlite'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///compression_db.sqlite')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['COMPRESSED_FOLDER'] = 'compressed'
+# Anchor storage to the app directory so the working directory doesn't matter
+app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'uploads')
+app.config['COMPRESSED_FOLDER'] = os.path.join(app.root_path, 'compressed')
+
+# Storage lifecycle settings
+app.config['KEEP_ORIGINAL_FILES'] = os.environ.get('KEEP_ORIGINAL_FILES', 'true').lower() == 'true'
+app.config['USER_STORAGE_QUOTA'] = int(os.environ.get('USER_STORAGE_QUOTA', 100 * 1024 * 1024))  # 0 disables the quota
+app.config['STORAGE_GC_INTERVAL'] = int(os.environ.get('STORAGE_GC_INTERVAL', 3600))  # seconds, 0 disables the GC
+app.config['STORAGE_GC_GRACE_PERIOD'] = int(os.environ.get('STORAGE_GC_GRACE_PERIOD', 600))  # skip files younger than this
 
 db = SQLAlchemy(app)
 
-# Create upload directories
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['COMPRESSED_FOLDER'], exist_ok=True)
+# Create upload directories (files are sharded into hashed subdirectories)
+storage = StorageManager(app.config['UPLOAD_FOLDER'], app.config['COMPRESSED_FOLDER'])
 
 # Database Models
 class User(db.Model):
@@ -48,6 +55,7 @@ class TextFile(db.Model):
     file_size = db.Column(db.Integer, nullable=False)
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
+    stored_size = db.Column(db.Integer, nullable=False, default=0)  # bytes of plaintext kept on disk
     
     # Relationships
     compressed_files = db.relationship('CompressedFile', backref='original_file', lazy=True)
@@ -63,6 +71,7 @@ class CompressedFile(db.Model):
     compressed_size = db.Column(db.Integer, nullable=False)
     compression_time = db.Column(db.Float, nullable=False)
     compression_date = db.Column(db.DateTime, default=datetime.utcnow)
+    stored_size = db.Column(db.Integer, nullable=False, default=0)  # bytes of the pickle on disk
 
 # Huffman Coding Implementation
 class HuffmanNode:
@@ -277,6 +286,116 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Storage accounting and garbage collection
+def resolve_storage_path(path):
+    """Older rows hold paths relative to the app directory; newer ones are absolute"""
+    if not path:
+        return ''
+    return path if os.path.isabs(path) else os.path.join(app.root_path, path)
+
+def upgrade_storage_schema():
+    """Add the stored_size columns to databases created before they existed"""
+    inspector = db.inspect(db.engine)
+    for model in (TextFile, CompressedFile):
+        columns = {column['name'] for column in inspector.get_columns(model.__tablename__)}
+        if 'stored_size' in columns:
+            continue
+        
+        with db.engine.begin() as connection:
+            connection.execute(db.text(
+                f"ALTER TABLE {model.__tablename__} ADD COLUMN stored_size INTEGER NOT NULL DEFAULT 0"
+            ))
+        
+        # Backfill from what is actually on disk for the existing rows
+        for row in model.query.all():
+            path = row.file_path if model is TextFile else row.compressed_content_path
+            row.stored_size = storage.file_size(resolve_storage_path(path))
+        db.session.commit()
+        print(f"Added stored_size to {model.__tablename__}")
+
+def get_user_storage_usage(user_id):
+    """Return the bytes charged against a user's quota, from the recorded on-disk sizes"""
+    original_bytes = db.session.query(db.func.coalesce(db.func.sum(TextFile.stored_size), 0)).filter(
+        TextFile.user_id == user_id
+    ).scalar()
+    compressed_bytes = db.session.query(db.func.coalesce(db.func.sum(CompressedFile.stored_size), 0)).join(
+        TextFile, TextFile.file_id == CompressedFile.file_id
+    ).filter(TextFile.user_id == user_id).scalar()
+    
+    return {
+        'original_bytes': original_bytes,
+        'compressed_bytes': compressed_bytes,
+        'total_bytes': original_bytes + compressed_bytes,
+        'quota_bytes': app.config['USER_STORAGE_QUOTA']
+    }
+
+def collect_storage_garbage():
+    """Delete rows whose files are gone and files no row refers to"""
+    stats = {'rows_removed': 0, 'files_removed': 0}
+    row_cutoff = datetime.utcnow() - timedelta(seconds=app.config['STORAGE_GC_GRACE_PERIOD'])
+    
+    # Rows are only pruned for absolute paths inside a root that holds files: legacy
+    # relative paths depended on the old working directory, and an empty root means
+    # the storage isn't mounted rather than that every file is gone
+    def is_missing(path, root):
+        return os.path.isabs(path) and storage.is_within(path, root) and not os.path.exists(path)
+    
+    # Compressed results whose pickle has disappeared can no longer be downloaded
+    if storage.has_files(storage.compressed_folder):
+        for compressed_file in CompressedFile.query.filter(CompressedFile.compression_date < row_cutoff).all():
+            if is_missing(compressed_file.compressed_content_path, storage.compressed_folder):
+                db.session.delete(compressed_file)
+                stats['rows_removed'] += 1
+        db.session.flush()
+    
+    # Text files without a compressed result are hidden from history and can't be
+    # deleted by the user, so the row goes and so does any plaintext still kept
+    upload_root_ready = storage.has_files(storage.upload_folder)
+    stale_originals = []
+    orphaned_files = TextFile.query.filter(
+        TextFile.upload_date < row_cutoff, ~TextFile.compressed_files.any()
+    ).all()
+    for text_file in orphaned_files:
+        path = text_file.file_path
+        if path:
+            if not (upload_root_ready and os.path.isabs(path) and storage.is_within(path, storage.upload_folder)):
+                continue
+            stale_originals.append(path)
+        db.session.delete(text_file)
+        stats['rows_removed'] += 1
+    db.session.commit()
+    
+    for path in stale_originals:
+        if storage.delete(path):
+            stats['files_removed'] += 1
+    
+    referenced = set()
+    for (file_path,) in db.session.query(TextFile.file_path).all():
+        if file_path:
+            referenced.add(os.path.abspath(resolve_storage_path(file_path)))
+    for (compressed_path,) in db.session.query(CompressedFile.compressed_content_path).all():
+        referenced.add(os.path.abspath(resolve_storage_path(compressed_path)))
+    
+    # Files younger than the grace period may belong to a request still in flight
+    file_cutoff = time.time() - app.config['STORAGE_GC_GRACE_PERIOD']
+    for path, mtime in list(storage.iter_stored_files()):
+        if mtime < file_cutoff and os.path.abspath(path) not in referenced:
+            if storage.delete(path):
+                stats['files_removed'] += 1
+    
+    return stats
+
+storage_gc = StorageGarbageCollector(
+    app, collect_storage_garbage, app.config['STORAGE_GC_INTERVAL'],
+    os.path.join(app.instance_path, 'storage_gc.lock')
+)
+
+@app.before_request
+def start_storage_gc():
+    # Started lazily so it runs in whichever processes actually serve requests:
+    # the dev server child (not the reloader parent) and every WSGI worker
+    storage_gc.start()
+
 # Routes
 @app.route('/')
 def index():
@@ -388,6 +507,8 @@ def dashboard():
         print(f"Dashboard error: {str(e)}")
         return redirect(url_for('index'))
 
+QUOTA_EXCEEDED_MESSAGE = 'Storage quota exceeded. Delete some files from your history and try again.'
+
 @app.route('/compress', methods=['POST'])
 @login_required
 def compress_file():
@@ -411,47 +532,82 @@ def compress_file():
         if not content.strip():
             return jsonify({'success': False, 'message': 'File is empty'})
         
-        # Save original file
         filename = secure_filename(file.filename)
         unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        original_size = len(content.encode('utf-8'))
+        quota = app.config['USER_STORAGE_QUOTA']
         
-        # Save file record
-        text_file = TextFile(
-            filename=filename,
-            file_path=file_path,
-            file_size=len(content.encode('utf-8')),
-            user_id=session['user_id']
-        )
-        db.session.add(text_file)
-        db.session.flush()  # Get the ID
+        # Cheap quota pre-check so over-quota users don't pay for compression
+        if quota:
+            estimated = original_size if app.config['KEEP_ORIGINAL_FILES'] else 0
+            if get_user_storage_usage(session['user_id'])['total_bytes'] + estimated > quota:
+                return jsonify({'success': False, 'message': QUOTA_EXCEEDED_MESSAGE})
         
         # Compress using hybrid algorithm
         compressor = HybridCompressor()
         compressed_data, metadata = compressor.compress(content)
+        payload = pickle.dumps({'data': compressed_data, 'metadata': metadata})
         
-        # Save compressed file
-        compressed_filename = f"compressed_{unique_filename}.pkl"
-        compressed_path = os.path.join(app.config['COMPRESSED_FOLDER'], compressed_filename)
-        
-        with open(compressed_path, 'wb') as f:
-            pickle.dump({'data': compressed_data, 'metadata': metadata}, f)
-        
-        # Save compression result
-        compressed_file = CompressedFile(
-            file_id=text_file.file_id,
-            compressed_content_path=compressed_path,
-            compression_ratio=metadata['compression_ratio'],
-            original_size=metadata['original_size'],
-            compressed_size=metadata['compressed_size'],
-            compression_time=metadata['compression_time']
-        )
+        # Only drop the plaintext once a round trip proves it can be recovered
+        keep_original = app.config['KEEP_ORIGINAL_FILES']
+        if not keep_original:
+            try:
+                keep_original = compressor.decompress(compressed_data, metadata) != content
+            except Exception as e:
+                print(f"Verification error: {str(e)}")  # For debugging
+                keep_original = True
         
-        db.session.add(compressed_file)
-        db.session.commit()
+        file_path = storage.original_path(unique_filename) if keep_original else ''
+        compressed_path = storage.compressed_path(f"compressed_{unique_filename}.pkl")
+        
+        written_paths = []
+        try:
+            # Files are written before any row, so no database lock is held during the disk writes
+            if keep_original:
+                written_paths.append(storage.write(file_path, content.encode('utf-8')))
+            written_paths.append(storage.write(compressed_path, payload))
+            
+            # Lock the user's row so concurrent uploads by the same user are checked one at a time
+            User.query.filter_by(user_id=session['user_id']).with_for_update().one()
+            
+            # Save file record
+            text_file = TextFile(
+                filename=filename,
+                file_path=file_path,
+                file_size=original_size,
+                user_id=session['user_id'],
+                stored_size=original_size if keep_original else 0
+            )
+            db.session.add(text_file)
+            db.session.flush()  # Get the ID
+            
+            # Save compression result
+            compressed_file = CompressedFile(
+                file_id=text_file.file_id,
+                compressed_content_path=compressed_path,
+                compression_ratio=metadata['compression_ratio'],
+                original_size=metadata['original_size'],
+                compressed_size=metadata['compressed_size'],
+                compression_time=metadata['compression_time'],
+                stored_size=len(payload)
+            )
+            db.session.add(compressed_file)
+            db.session.flush()
+            
+            # Authoritative quota check against the real bytes written. SQLite has no row
+            # locks, but there the flushed inserts already hold its single write lock
+            if quota and get_user_storage_usage(session['user_id'])['total_bytes'] > quota:
+                db.session.rollback()
+                for path in written_paths:
+                    storage.delete(path)
+                return jsonify({'success': False, 'message': QUOTA_EXCEEDED_MESSAGE})
+            
+            db.session.commit()
+        except Exception:
+            # Don't leave orphaned files behind when the records were not saved
+            for path in written_paths:
+                storage.delete(path)
+            raise
         
         return jsonify({
             'success': True,
@@ -482,11 +638,12 @@ def download_compressed(file_id):
         if not compressed_file:
             return jsonify({'success': False, 'message': 'Compressed file not found'})
         
-        if not os.path.exists(compressed_file.compressed_content_path):
+        compressed_path = resolve_storage_path(compressed_file.compressed_content_path)
+        if not os.path.exists(compressed_path):
             return jsonify({'success': False, 'message': 'Compressed file not found on disk'})
         
         return send_file(
-            compressed_file.compressed_content_path,
+            compressed_path,
             as_attachment=True,
             download_name=f"compressed_{text_file.filename}.pkl"
         )
@@ -521,6 +678,51 @@ def compression_history():
         print(f"History error: {str(e)}")  # For debugging
         return jsonify({'success': False, 'message': 'Failed to load history'})
 
+@app.route('/delete/<int:file_id>', methods=['POST'])
+@login_required
+def delete_file(file_id):
+    try:
+        text_file = TextFile.query.filter_by(file_id=file_id, user_id=session['user_id']).first()
+        if not text_file:
+            return jsonify({'success': False, 'message': 'File not found'})
+        
+        paths = [text_file.file_path]
+        for compressed_file in text_file.compressed_files:
+            paths.append(compressed_file.compressed_content_path)
+            db.session.delete(compressed_file)
+        db.session.delete(text_file)
+        db.session.commit()
+        
+        # Files go only after the rows; anything left behind is picked up by the GC
+        for path in paths:
+            storage.delete(resolve_storage_path(path))
+        
+        return jsonify({'success': True, 'message': 'File deleted successfully'})
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"Delete error: {str(e)}")  # For debugging
+        return jsonify({'success': False, 'message': 'Failed to delete file'})
+
+@app.route('/usage')
+@login_required
+def storage_usage():
+    try:
+        usage = get_user_storage_usage(session['user_id'])
+        
+        # Measure what is actually on disk; only done here, never per upload
+        rows = db.session.query(TextFile.file_path, CompressedFile.compressed_content_path).outerjoin(
+            CompressedFile, TextFile.file_id == CompressedFile.file_id
+        ).filter(TextFile.user_id == session['user_id']).all()
+        disk_paths = {resolve_storage_path(path) for row in rows for path in row if path}
+        usage['disk_bytes'] = sum(storage.file_size(path) for path in disk_paths)
+        
+        return jsonify({'success': True, 'usage': usage})
+        
+    except Exception as e:
+        print(f"Usage error: {str(e)}")  # For debugging
+        return jsonify({'success': False, 'message': 'Failed to load storage usage'})
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -539,6 +741,7 @@ if __name__ == '__main__':
     with app.app_context():
         # Create all database tables
         db.create_all()
+        upgrade_storage_schema()
         print("Database tables created successfully!")
         
         # Print some helpful information
@@ -549,5 +752,6 @@ if __name__ == '__main__':
         print("  - /register (Registration)")
         print("  - /login (Login)")
         print("  - /dashboard (User Dashboard)")
+        print("  - /usage (Storage Usage)")
         
     app.run(debug=True, port=5001)
\ No newline at end of file
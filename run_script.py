@@ -7,7 +7,7 @@ from dotenv import load_dotenv
 load_dotenv()
 import os
 import sys
-from app import app, db
+from app import app, db, upgrade_storage_schema
 
 def create_directories():
     """Create necessary directories if they don't exist"""
@@ -22,6 +22,7 @@ def initialize_database():
     try:
         with app.app_context():
             db.create_all()
+            upgrade_storage_schema()
             print("Database tables created successfully!")
     except Exception as e:
         print(f"Error creating database tables: {e}")
@@ -0,0 +1,144 @@
+"""
+Storage layer for the Hybrid Text Compression System
+Handles sharded file placement and background cleanup
+"""
+import hashlib
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; fall back to an in-process lock only
+    fcntl = None
+
+
+class StorageManager:
+    """Places files into hashed, sharded subdirectories of a storage root"""
+
+    def __init__(self, upload_folder, compressed_folder, shard_depth=2, shard_width=2):
+        self.upload_folder = os.path.abspath(upload_folder)
+        self.compressed_folder = os.path.abspath(compressed_folder)
+        self.shard_depth = shard_depth
+        self.shard_width = shard_width
+
+        os.makedirs(self.upload_folder, exist_ok=True)
+        os.makedirs(self.compressed_folder, exist_ok=True)
+
+    def shard_path(self, root, filename):
+        """Return root/ab/cd/filename, where ab/cd come from a hash of the filename"""
+        digest = hashlib.sha256(filename.encode('utf-8')).hexdigest()
+        shards = [digest[i * self.shard_width:(i + 1) * self.shard_width] for i in range(self.shard_depth)]
+        return os.path.join(root, *shards, filename)
+
+    def original_path(self, filename):
+        return self.shard_path(self.upload_folder, filename)
+
+    def compressed_path(self, filename):
+        return self.shard_path(self.compressed_folder, filename)
+
+    def write(self, path, data):
+        """Write data to path so that path never holds a partial file"""
+        # Shard directories are never removed, so creating them here cannot race a delete
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def delete(self, path):
+        if not path:
+            return False
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"Storage delete error for {path}: {str(e)}")  # For debugging
+            return False
+        return True
+
+    @staticmethod
+    def file_size(path):
+        if not path:
+            return 0
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def is_within(path, root):
+        path = os.path.abspath(path)
+        return os.path.commonpath([path, root]) == root
+
+    @staticmethod
+    def has_files(root):
+        """True when root holds at least one file, i.e. that storage is actually mounted"""
+        return any(filenames for _, _, filenames in os.walk(root))
+
+    def iter_stored_files(self):
+        """Yield (path, mtime) for every file under both storage roots"""
+        for root in (self.upload_folder, self.compressed_folder):
+            for dirpath, _, filenames in os.walk(root):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        yield path, os.path.getmtime(path)
+                    except OSError:
+                        continue
+
+
+class StorageGarbageCollector:
+    """Runs a collection function periodically on a daemon thread
+
+    Every process that serves requests may start a collector (the dev server
+    child, each gunicorn worker); a lock file makes sure only one of them
+    collects at a time.
+    """
+
+    def __init__(self, app, collect, interval, lock_path):
+        self.app = app
+        self.collect = collect
+        self.interval = interval
+        self.lock_path = lock_path
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='storage-gc', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run_once(self):
+        """Collect unless another process is already collecting; return the stats or None"""
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return None
+            with self.app.app_context():
+                return self.collect()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            started = time.time()
+            try:
+                stats = self.run_once()
+                if stats is not None:
+                    print(f"Storage GC finished in {time.time() - started:.2f}s: {stats}")
+            except Exception as e:
+                print(f"Storage GC error: {str(e)}")  # For debugging
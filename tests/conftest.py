@@ -0,0 +1,44 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# The app reads these at import time, so set them before it is imported
+_TEST_DIR = tempfile.mkdtemp(prefix='hybrid-compression-tests-')
+atexit.register(shutil.rmtree, _TEST_DIR, ignore_errors=True)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_TEST_DIR, 'test.sqlite')}"
+os.environ['STORAGE_GC_INTERVAL'] = '0'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+from storage import StorageManager  # noqa: E402
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    manager = StorageManager(str(tmp_path / 'uploads'), str(tmp_path / 'compressed'))
+    monkeypatch.setattr(app_module, 'storage', manager)
+    return manager
+
+
+@pytest.fixture
+def client(storage):
+    app_module.app.config['TESTING'] = True
+    with app_module.app.app_context():
+        app_module.db.drop_all()
+        app_module.db.create_all()
+
+        user = app_module.User(username='tester', email='tester@example.com', password_hash='x')
+        app_module.db.session.add(user)
+        app_module.db.session.commit()
+        user_id = user.user_id
+
+    with app_module.app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['username'] = 'tester'
+        yield client
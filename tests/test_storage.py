@@ -0,0 +1,251 @@
+import io
+import os
+import time
+from datetime import datetime, timedelta
+
+import app as app_module
+
+
+def upload(client, text='hello hello hello world', name='sample.txt'):
+    data = {'file': (io.BytesIO(text.encode('utf-8')), name)}
+    return client.post('/compress', data=data, content_type='multipart/form-data').get_json()
+
+
+def stored_files(storage):
+    return sorted(path for path, _ in storage.iter_stored_files())
+
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def age_rows(seconds):
+    past = datetime.utcnow() - timedelta(seconds=seconds)
+    app_module.TextFile.query.update({'upload_date': past})
+    app_module.CompressedFile.query.update({'compression_date': past})
+    app_module.db.session.commit()
+
+
+def add_legacy_row(compressed_path):
+    text_file = app_module.TextFile(
+        filename='legacy.txt', file_path='uploads/legacy.txt', file_size=6, user_id=1
+    )
+    app_module.db.session.add(text_file)
+    app_module.db.session.flush()
+    app_module.db.session.add(app_module.CompressedFile(
+        file_id=text_file.file_id, compressed_content_path=compressed_path, compression_ratio=1.0,
+        original_size=6, compressed_size=6, compression_time=0.0
+    ))
+    app_module.db.session.commit()
+    return text_file.file_id
+
+
+def test_shard_path_layout(storage):
+    path = storage.compressed_path('abc.pkl')
+    relative = os.path.relpath(path, storage.compressed_folder).split(os.sep)
+
+    assert len(relative) == 3
+    assert all(len(part) == 2 for part in relative[:2])
+    assert relative[2] == 'abc.pkl'
+    assert storage.compressed_path('abc.pkl') == path
+
+
+def test_compress_writes_sharded_files(client, storage):
+    result = upload(client)
+
+    assert result['success']
+    with app_module.app.app_context():
+        text_file = app_module.db.session.get(app_module.TextFile, result['result']['file_id'])
+        compressed_file = text_file.compressed_files[0]
+        assert os.path.dirname(os.path.dirname(os.path.dirname(text_file.file_path))) == storage.upload_folder
+        assert os.path.exists(text_file.file_path)
+        assert os.path.exists(compressed_file.compressed_content_path)
+
+
+def test_compress_can_skip_original(client, storage, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'KEEP_ORIGINAL_FILES', False)
+
+    result = upload(client)
+
+    assert result['success']
+    assert not any(path.startswith(storage.upload_folder) for path in stored_files(storage))
+
+
+def test_failed_verification_keeps_original(client, storage, monkeypatch):
+    def failing_decompress(self, compressed_data, metadata):
+        raise ValueError('corrupt')
+
+    monkeypatch.setitem(app_module.app.config, 'KEEP_ORIGINAL_FILES', False)
+    monkeypatch.setattr(app_module.HybridCompressor, 'decompress', failing_decompress)
+    result = upload(client)
+
+    assert result['success']
+    assert any(path.startswith(storage.upload_folder) for path in stored_files(storage))
+
+
+def test_failed_commit_removes_written_files(client, storage, monkeypatch):
+    def failing_commit():
+        raise RuntimeError('commit failed')
+
+    monkeypatch.setattr(app_module.db.session, 'commit', failing_commit)
+    result = upload(client)
+
+    assert not result['success']
+    assert stored_files(storage) == []
+
+
+def test_quota_rejects_upload(client, storage, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'USER_STORAGE_QUOTA', 10)
+
+    result = upload(client)
+
+    assert not result['success']
+    assert 'quota' in result['message'].lower()
+    assert stored_files(storage) == []
+    with app_module.app.app_context():
+        assert app_module.TextFile.query.count() == 0
+
+
+def test_delete_frees_rows_and_files(client, storage):
+    file_id = upload(client)['result']['file_id']
+
+    result = client.post(f'/delete/{file_id}').get_json()
+
+    assert result['success']
+    assert stored_files(storage) == []
+    with app_module.app.app_context():
+        assert app_module.get_user_storage_usage(1)['total_bytes'] == 0
+
+
+def test_gc_keeps_referenced_and_young_files(client, storage):
+    upload(client)
+    referenced = stored_files(storage)
+    for path in referenced:
+        age(path, 3600)
+
+    young_orphan = storage.write(storage.compressed_path('young.pkl'), b'x')
+    old_orphan = storage.write(storage.compressed_path('old.pkl'), b'x')
+    age(old_orphan, 3600)
+
+    with app_module.app.app_context():
+        stats = app_module.collect_storage_garbage()
+
+    assert stats['files_removed'] == 1
+    assert stored_files(storage) == sorted(referenced + [young_orphan])
+
+
+def test_gc_skips_rows_when_storage_is_empty(client, storage):
+    upload(client)
+    for path in stored_files(storage):
+        os.remove(path)
+
+    with app_module.app.app_context():
+        age_rows(3600)
+        app_module.collect_storage_garbage()
+
+        assert app_module.CompressedFile.query.count() == 1
+        assert app_module.TextFile.query.count() == 1
+
+
+def test_gc_prunes_rows_with_missing_pickle(client, storage):
+    kept_id = upload(client)['result']['file_id']
+    lost_id = upload(client, name='lost.txt')['result']['file_id']
+
+    with app_module.app.app_context():
+        age_rows(3600)
+        lost = app_module.db.session.get(app_module.TextFile, lost_id)
+        original_path = lost.file_path
+        os.remove(lost.compressed_files[0].compressed_content_path)
+
+        stats = app_module.collect_storage_garbage()
+
+        assert stats['rows_removed'] == 2
+        assert [row.file_id for row in app_module.TextFile.query.all()] == [kept_id]
+        assert app_module.CompressedFile.query.count() == 1
+    assert not os.path.exists(original_path)
+
+
+def test_gc_prunes_rows_without_originals(client, storage, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'KEEP_ORIGINAL_FILES', False)
+    upload(client)
+    lost_id = upload(client, name='lost.txt')['result']['file_id']
+
+    with app_module.app.app_context():
+        age_rows(3600)
+        lost = app_module.db.session.get(app_module.TextFile, lost_id)
+        os.remove(lost.compressed_files[0].compressed_content_path)
+
+        stats = app_module.collect_storage_garbage()
+
+        assert stats['rows_removed'] == 2
+        assert app_module.TextFile.query.count() == 1
+        assert app_module.CompressedFile.query.count() == 1
+
+
+def test_gc_keeps_legacy_relative_rows(client, storage):
+    upload(client)
+
+    with app_module.app.app_context():
+        legacy = add_legacy_row('compressed/compressed_legacy.txt.pkl')
+        age_rows(3600)
+
+        app_module.collect_storage_garbage()
+
+        assert app_module.db.session.get(app_module.TextFile, legacy) is not None
+        assert app_module.CompressedFile.query.count() == 2
+
+
+def test_download_resolves_legacy_relative_path(client, storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module.app, 'root_path', str(tmp_path))
+    (tmp_path / 'compressed' / 'compressed_legacy.txt.pkl').write_bytes(b'legacy')
+
+    with app_module.app.app_context():
+        legacy = add_legacy_row('compressed/compressed_legacy.txt.pkl')
+
+    response = client.get(f'/download/{legacy}')
+
+    assert response.status_code == 200
+    assert response.data == b'legacy'
+
+
+def test_usage_charges_bytes_on_disk(client, storage, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'KEEP_ORIGINAL_FILES', False)
+    upload(client)
+
+    usage = client.get('/usage').get_json()['usage']
+    pickle_size = sum(os.path.getsize(path) for path in stored_files(storage))
+
+    assert usage['original_bytes'] == 0
+    assert usage['compressed_bytes'] == pickle_size
+    assert usage['total_bytes'] == usage['disk_bytes'] == pickle_size
+
+
+def test_quota_counts_pickle_size(client, storage, monkeypatch):
+    # Large enough for the plaintext, too small once the pickle is charged
+    monkeypatch.setitem(app_module.app.config, 'USER_STORAGE_QUOTA', 100)
+
+    result = upload(client)
+
+    assert not result['success']
+    assert stored_files(storage) == []
+
+
+def test_upgrade_backfills_stored_size(client, storage):
+    upload(client)
+    pickle_path = [path for path in stored_files(storage) if path.startswith(storage.compressed_folder)][0]
+
+    with app_module.app.app_context():
+        with app_module.db.engine.begin() as connection:
+            connection.execute(app_module.db.text('ALTER TABLE compressed_files DROP COLUMN stored_size'))
+
+        app_module.upgrade_storage_schema()
+
+        assert app_module.CompressedFile.query.one().stored_size == os.path.getsize(pickle_path)
+
+
+def test_delete_ignores_os_errors(storage, tmp_path):
+    directory = tmp_path / 'not-a-file'
+    directory.mkdir()
+
+    assert storage.delete(str(directory)) is False